@@ -19,6 +19,9 @@ class Settings:
 
     output_dir: str = os.getenv("OUTPUT_DIR", "./output")
 
+    # Cache da introspecção dos templates (indexado pelo hash do arquivo)
+    template_cache_dir: str = os.getenv("TEMPLATE_CACHE_DIR", "./.cache/templates")
+
     # ===============================
     # Planilhas / abas
     # ===============================
@@ -41,7 +44,8 @@ class Settings:
     item_unit_column: str = os.getenv("ITEM_UNIT_COLUMN", "valor_unitario")
     item_total_column: str = os.getenv("ITEM_TOTAL_COLUMN", "valor_total")
 
-    max_items: int = int(os.getenv("MAX_ITEMS", "40"))
+    # Linhas 12..24 no template padrão (acima do TOTAL em D25/H25)
+    max_items: int = int(os.getenv("MAX_ITEMS", "13"))
 
     # ===============================
     # Células do template (comum PF/PJ)
@@ -7,6 +7,7 @@ from typing import Iterable
 import pandas as pd
 
 from src.config import settings
+from src.template_layout import TemplateLayout, introspect_template
 
 
 @dataclass(frozen=True)
@@ -21,6 +22,11 @@ class PreflightReport:
     invoices_pj: int
 
 
+# Limites de uma planilha .xlsx
+_EXCEL_MAX_ROW = 1048576
+_EXCEL_MAX_COL = 16384
+
+
 def _require(cond: bool, msg: str) -> None:
     if not cond:
         raise ValueError(msg)
@@ -32,6 +38,122 @@ def _normalize_cols(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def _template_targets() -> list[tuple[str, str]]:
+    """
+    Lista (nome da configuração, endereço) de todas as células que o
+    fill_template escreve, incluindo a área completa de itens.
+    """
+    targets = [
+        ("CELL_DOC", settings.cell_doc),
+        ("CELL_NAME", settings.cell_name),
+        ("CELL_DATE", settings.cell_date),
+        ("CELL_TOTAL", settings.cell_total),
+        ("CELL_MONTH_REF", settings.cell_month_ref),
+        ("CELL_CARD_NUMBER", settings.cell_card_number),
+        ("CELL_MONTHLY_SUM", settings.cell_monthly_sum),
+    ]
+
+    item_cols = [
+        ("COL_ITEM_DESC", settings.col_item_desc),
+        ("COL_ITEM_QTY", settings.col_item_qty),
+        ("COL_ITEM_UNIT", settings.col_item_unit),
+        ("COL_ITEM_TOTAL", settings.col_item_total),
+    ]
+    for i in range(settings.max_items):
+        r = settings.items_start_row + i
+        targets.extend((f"{name} (linha {r})", f"{col}{r}") for name, col in item_cols)
+
+    return targets
+
+
+def _check_template_layout(layout: TemplateLayout, label: str) -> None:
+    """
+    Valida que todas as células configuradas são graváveis no template:
+    endereço válido, fora de merges (ou na célula top-left do merge),
+    vazia no template e sem duas configurações apontando para a mesma célula.
+    """
+    from openpyxl.utils.cell import column_index_from_string, coordinate_from_string, get_column_letter
+    from openpyxl.utils.exceptions import CellCoordinatesException
+    from openpyxl.worksheet.cell_range import CellRange
+
+    _require(
+        settings.sheet_template in layout.sheets,
+        f"Template {label} '{layout.path.name}' não contém a aba '{settings.sheet_template}'. "
+        f"Abas: {layout.sheetnames}",
+    )
+    _require(settings.items_start_row >= 1, f"ITEMS_START_ROW inválido: {settings.items_start_row}")
+    _require(settings.max_items >= 0, f"MAX_ITEMS inválido: {settings.max_items}")
+
+    sheet = layout.sheets[settings.sheet_template]
+    merged = [CellRange(r) for r in sheet.merged_ranges]
+
+    problems: list[str] = []
+    used: dict[str, str] = {}
+
+    for name, addr in _template_targets():
+        # Valida exatamente a string que o fill_template vai usar (sem normalizar)
+        try:
+            col, row = coordinate_from_string(addr)
+            col_idx = column_index_from_string(col)
+        except (CellCoordinatesException, ValueError):
+            problems.append(f"{name}: endereço inválido '{addr}'")
+            continue
+        if row > _EXCEL_MAX_ROW or col_idx > _EXCEL_MAX_COL:
+            problems.append(f"{name}: endereço inválido '{addr}' (fora dos limites do Excel)")
+            continue
+
+        # Forma canônica ("b6" e "$B$6" são a mesma célula B6)
+        cell = f"{get_column_letter(col_idx)}{row}"
+
+        # Mesmo critério do _safe_set_cell: dentro de merge grava no top-left
+        anchor = next(
+            (f"{get_column_letter(rng.min_col)}{rng.min_row}" for rng in merged if cell in rng),
+            cell,
+        )
+        if anchor != cell:
+            problems.append(f"{name}: '{addr}' está dentro de um merge (gravaria em '{anchor}')")
+            continue
+
+        # Conteúdo estático do template (rótulos, fórmulas) seria sobrescrito/apagado
+        data_type = sheet.cells.get(cell)
+        if data_type == "f":
+            problems.append(f"{name}: '{addr}' contém fórmula no template e seria sobrescrita")
+        elif data_type is not None:
+            problems.append(f"{name}: '{addr}' contém valor no template e seria sobrescrita")
+
+        if cell in used:
+            problems.append(f"{name}: '{addr}' sobrepõe {used[cell]}")
+        else:
+            used[cell] = name
+
+    if problems:
+        shown = "\n  - ".join(problems[:10])
+        extra = f"\n  ... e mais {len(problems) - 10} problema(s)" if len(problems) > 10 else ""
+        raise ValueError(
+            f"Layout inválido no template {label} '{layout.path.name}' "
+            f"(aba '{settings.sheet_template}'):\n  - {shown}{extra}"
+        )
+
+
+def _check_items_per_invoice(docs: pd.Series) -> None:
+    """
+    Garante que nenhuma fatura tenha mais itens que a tabela do template comporta.
+    O total da fatura soma todas as linhas do grupo; itens além de MAX_ITEMS
+    sumiriam da listagem sem aviso.
+    """
+    items_per_doc = docs.value_counts()
+    over = items_per_doc[items_per_doc > settings.max_items]
+    if over.empty:
+        return
+
+    shown = ", ".join(f"{doc} ({n})" for doc, n in over.head(10).items())
+    extra = f" ... e mais {len(over) - 10}" if len(over) > 10 else ""
+    raise ValueError(
+        f"{len(over)} fatura(s) com mais itens que MAX_ITEMS={settings.max_items}: "
+        f"{shown}{extra}. Ajuste o template/MAX_ITEMS ou divida as faturas."
+    )
+
+
 def preflight_checks(df: pd.DataFrame) -> PreflightReport:
     """
     Valida ambiente/arquivos/config/dados ANTES do processamento.
@@ -104,15 +226,9 @@ def preflight_checks(df: pd.DataFrame) -> PreflightReport:
     _require((qtd_parcelas >= 1).all(), "Há 'qtd_parcelas' menor que 1.")
     _require((valor_parcela >= 0).all(), "Há 'valor_parcela' negativo.")
 
-    # ===== Check de template: aba existe =====
-    from openpyxl import load_workbook
-
+    # ===== Check de template: aba + layout das células configuradas =====
     for tpath, label in [(template_pf, "PF"), (template_pj, "PJ")]:
-        wb = load_workbook(tpath)
-        _require(
-            settings.sheet_template in wb.sheetnames,
-            f"Template {label} '{tpath.name}' não contém a aba '{settings.sheet_template}'. Abas: {wb.sheetnames}",
-        )
+        _check_template_layout(introspect_template(tpath), label)
 
     # ===== Contagens (quantas faturas serão geradas) =====
     # Uma fatura por documento_cliente (do jeito que o group_invoices faz hoje)
@@ -126,6 +242,8 @@ def preflight_checks(df: pd.DataFrame) -> PreflightReport:
     # Check de “explosão” (proteção simples)
     _require(unique_docs <= 5000, f"Número muito alto de faturas ({unique_docs}). Verifique agrupamento/arquivo.")
 
+    _check_items_per_invoice(df_doc)
+
     return PreflightReport(
         input_path=input_path,
         template_pf=template_pf,
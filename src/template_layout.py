@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from src.config import settings
+
+# Incrementar quando o formato do cache mudar (invalida caches antigos)
+_CACHE_VERSION = 1
+
+
+@dataclass(frozen=True)
+class SheetLayout:
+    name: str
+    # Ranges mesclados no formato "D6:E6"
+    merged_ranges: tuple[str, ...]
+    # Células não vazias do template: coordenada -> tipo openpyxl ("s", "n", "f", ...)
+    cells: dict[str, str]
+
+
+@dataclass(frozen=True)
+class TemplateLayout:
+    path: Path
+    sha256: str
+    sheets: dict[str, SheetLayout]
+
+    @property
+    def sheetnames(self) -> list[str]:
+        return list(self.sheets)
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _introspect_workbook(path: Path, sha256: str) -> TemplateLayout:
+    # Import tardio: só carrega openpyxl quando o cache não resolve
+    from openpyxl import load_workbook
+
+    wb = load_workbook(path)
+    sheets: dict[str, SheetLayout] = {}
+
+    for ws in wb.worksheets:
+        cells = {
+            cell.coordinate: cell.data_type
+            for row in ws.iter_rows()
+            for cell in row
+            if cell.value is not None
+        }
+        sheets[ws.title] = SheetLayout(
+            name=ws.title,
+            merged_ranges=tuple(str(r) for r in ws.merged_cells.ranges),
+            cells=cells,
+        )
+
+    return TemplateLayout(path=path, sha256=sha256, sheets=sheets)
+
+
+def _load_cached(cache_file: Path, path: Path, sha256: str) -> TemplateLayout | None:
+    try:
+        data = json.loads(cache_file.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(data, dict):
+        return None
+
+    if data.get("version") != _CACHE_VERSION or data.get("sha256") != sha256:
+        return None
+
+    try:
+        sheets = {
+            s["name"]: SheetLayout(
+                name=s["name"],
+                merged_ranges=tuple(s["merged_ranges"]),
+                cells=dict(s["cells"]),
+            )
+            for s in data["sheets"]
+        }
+    except (KeyError, TypeError, ValueError):
+        return None
+
+    return TemplateLayout(path=path, sha256=sha256, sheets=sheets)
+
+
+def _save_cache(cache_file: Path, layout: TemplateLayout) -> None:
+    data = {
+        "version": _CACHE_VERSION,
+        "sha256": layout.sha256,
+        "sheets": [asdict(s) for s in layout.sheets.values()],
+    }
+
+    # Cache é só otimização: falha de escrita não deve interromper o preflight
+    tmp = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass
+    finally:
+        # Não deixa .tmp órfão no diretório de cache se a escrita/troca falhar
+        tmp.unlink(missing_ok=True)
+
+
+def introspect_template(template_file: Path) -> TemplateLayout:
+    """
+    Extrai abas, ranges mesclados e mapa de células de um template.
+
+    O resultado fica em cache no disco (TEMPLATE_CACHE_DIR), indexado pelo
+    hash SHA-256 do conteúdo do arquivo. Templates não alterados são lidos
+    do cache sem abrir o workbook; qualquer alteração no arquivo gera novo hash.
+    """
+    sha256 = _file_sha256(template_file)
+    cache_file = Path(settings.template_cache_dir) / f"{sha256}.json"
+
+    layout = _load_cached(cache_file, template_file, sha256)
+    if layout is not None:
+        return layout
+
+    layout = _introspect_workbook(template_file, sha256)
+    _save_cache(cache_file, layout)
+    return layout
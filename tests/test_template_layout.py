@@ -0,0 +1,227 @@
+import dataclasses
+import json
+from pathlib import Path
+
+import pytest
+import pandas as pd
+from openpyxl import Workbook
+
+import src.preflight as preflight
+import src.template_layout as template_layout
+from src.config import settings
+
+
+# Layout padrão dos templates (independente do .env local)
+DEFAULT_LAYOUT = dict(
+    sheet_template="Fatura",
+    cell_doc="B6",
+    cell_name="B7",
+    cell_date="B8",
+    cell_total="H25",
+    cell_month_ref="D6",
+    cell_card_number="D7",
+    cell_monthly_sum="D8",
+    items_start_row=12,
+    max_items=13,
+    col_item_desc="B",
+    col_item_qty="F",
+    col_item_unit="G",
+    col_item_total="H",
+)
+
+
+@pytest.fixture
+def cfg(monkeypatch, tmp_path):
+    """Aplica overrides de Settings nos módulos que importaram `settings`."""
+
+    def apply(**overrides):
+        s = dataclasses.replace(
+            settings,
+            template_cache_dir=str(tmp_path / "cache"),
+            **{**DEFAULT_LAYOUT, **overrides},
+        )
+        monkeypatch.setattr(preflight, "settings", s)
+        monkeypatch.setattr(template_layout, "settings", s)
+        return s
+
+    apply()
+    return apply
+
+
+def _make_template(path: Path, merges=(), values=None) -> Path:
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Fatura"
+    for rng in merges:
+        ws.merge_cells(rng)
+    for addr, value in (values or {}).items():
+        ws[addr] = value
+    wb.save(path)
+    return path
+
+
+def _check(path: Path) -> None:
+    preflight._check_template_layout(template_layout.introspect_template(path), "PF")
+
+
+def _count_loads(monkeypatch) -> list:
+    calls = []
+    original = template_layout._introspect_workbook
+
+    def spy(path, sha256):
+        calls.append(path)
+        return original(path, sha256)
+
+    monkeypatch.setattr(template_layout, "_introspect_workbook", spy)
+    return calls
+
+
+# ===============================
+# Cache
+# ===============================
+def test_cache_miss_then_hit(cfg, monkeypatch, tmp_path):
+    tpl = _make_template(tmp_path / "t.xlsx", merges=["D6:E6"], values={"A6": "Documento:"})
+    calls = _count_loads(monkeypatch)
+
+    first = template_layout.introspect_template(tpl)
+    second = template_layout.introspect_template(tpl)
+
+    assert len(calls) == 1
+    assert second == first
+    assert first.sheetnames == ["Fatura"]
+    assert first.sheets["Fatura"].merged_ranges == ("D6:E6",)
+    assert first.sheets["Fatura"].cells == {"A6": "s"}
+    assert (tmp_path / "cache" / f"{first.sha256}.json").exists()
+
+
+def test_cache_invalidated_when_template_changes(cfg, monkeypatch, tmp_path):
+    tpl = _make_template(tmp_path / "t.xlsx")
+    calls = _count_loads(monkeypatch)
+
+    first = template_layout.introspect_template(tpl)
+    _make_template(tpl, merges=["B30:E32"])
+    second = template_layout.introspect_template(tpl)
+
+    assert len(calls) == 2
+    assert second.sha256 != first.sha256
+    assert second.sheets["Fatura"].merged_ranges == ("B30:E32",)
+
+
+@pytest.mark.parametrize("content", ["[]", '"x"', "{", '{"version": 1, "sha256": "%s", "sheets": ["x"]}'])
+def test_corrupted_cache_falls_back_to_introspection(cfg, monkeypatch, tmp_path, content):
+    tpl = _make_template(tmp_path / "t.xlsx")
+    sha256 = template_layout._file_sha256(tpl)
+    cache_file = tmp_path / "cache" / f"{sha256}.json"
+    cache_file.parent.mkdir(parents=True)
+    cache_file.write_text(content.replace("%s", sha256), encoding="utf-8")
+    calls = _count_loads(monkeypatch)
+
+    layout = template_layout.introspect_template(tpl)
+
+    assert len(calls) == 1
+    assert layout.sheetnames == ["Fatura"]
+    assert json.loads(cache_file.read_text(encoding="utf-8"))["sha256"] == sha256
+
+
+def test_failed_cache_write_leaves_no_tmp_file(cfg, monkeypatch, tmp_path):
+    tpl = _make_template(tmp_path / "t.xlsx")
+
+    def fail(src, dst):
+        raise OSError("disco cheio")
+
+    monkeypatch.setattr(template_layout.os, "replace", fail)
+    layout = template_layout.introspect_template(tpl)
+
+    assert layout.sheetnames == ["Fatura"]
+    assert list((tmp_path / "cache").iterdir()) == []
+
+
+# ===============================
+# Validação de layout
+# ===============================
+def test_default_layout_is_valid(cfg, tmp_path):
+    tpl = _make_template(tmp_path / "t.xlsx", merges=["D6:E6", "D7:E7", "D8:E8", "B30:E32"])
+    _check(tpl)
+
+
+def test_missing_sheet(cfg, tmp_path):
+    cfg(sheet_template="Outra")
+    tpl = _make_template(tmp_path / "t.xlsx")
+    with pytest.raises(ValueError, match="não contém a aba 'Outra'"):
+        _check(tpl)
+
+
+def test_non_anchor_merge_cell(cfg, tmp_path):
+    cfg(cell_month_ref="E6")
+    tpl = _make_template(tmp_path / "t.xlsx", merges=["D6:E6"])
+    with pytest.raises(ValueError, match=r"CELL_MONTH_REF: 'E6' está dentro de um merge \(gravaria em 'D6'\)"):
+        _check(tpl)
+
+
+def test_item_area_inside_merge(cfg, tmp_path):
+    cfg(max_items=40)
+    tpl = _make_template(tmp_path / "t.xlsx", merges=["B30:E32"])
+    with pytest.raises(ValueError, match=r"COL_ITEM_DESC \(linha 31\): 'B31' está dentro de um merge"):
+        _check(tpl)
+
+
+def test_formula_cell(cfg, tmp_path):
+    tpl = _make_template(tmp_path / "t.xlsx", values={"H25": "=SUM(H12:H24)"})
+    with pytest.raises(ValueError, match="CELL_TOTAL: 'H25' contém fórmula"):
+        _check(tpl)
+
+
+def test_label_cell_in_item_area(cfg, tmp_path):
+    cfg(col_item_qty="D", max_items=14)
+    tpl = _make_template(tmp_path / "t.xlsx", values={"D25": "TOTAL:"})
+    with pytest.raises(ValueError, match=r"COL_ITEM_QTY \(linha 25\): 'D25' contém valor no template"):
+        _check(tpl)
+
+
+def test_item_area_over_table_header(cfg, tmp_path):
+    cfg(items_start_row=11)
+    tpl = _make_template(tmp_path / "t.xlsx", values={"B11": "Descrição"})
+    with pytest.raises(ValueError, match=r"COL_ITEM_DESC \(linha 11\): 'B11' contém valor no template"):
+        _check(tpl)
+
+
+def test_two_settings_on_same_cell(cfg, tmp_path):
+    cfg(cell_date="b6")
+    tpl = _make_template(tmp_path / "t.xlsx")
+    with pytest.raises(ValueError, match="CELL_DATE: 'b6' sobrepõe CELL_DOC"):
+        _check(tpl)
+
+
+def test_item_area_overlaps_total(cfg, tmp_path):
+    cfg(max_items=40)
+    tpl = _make_template(tmp_path / "t.xlsx")
+    with pytest.raises(ValueError, match=r"COL_ITEM_TOTAL \(linha 25\): 'H25' sobrepõe CELL_TOTAL"):
+        _check(tpl)
+
+
+@pytest.mark.parametrize("addr", ["Z0", " B6", "B6 ", "1B", "XFE1", "A1048577"])
+def test_invalid_address(cfg, tmp_path, addr):
+    cfg(cell_doc=addr)
+    tpl = _make_template(tmp_path / "t.xlsx")
+    with pytest.raises(ValueError, match=f"CELL_DOC: endereço inválido '{addr}'"):
+        _check(tpl)
+
+
+def test_item_area_past_excel_row_limit(cfg, tmp_path):
+    cfg(items_start_row=1048570, max_items=13)
+    tpl = _make_template(tmp_path / "t.xlsx")
+    with pytest.raises(ValueError, match=r"COL_ITEM_DESC \(linha 1048577\): endereço inválido 'B1048577'"):
+        _check(tpl)
+
+
+# ===============================
+# Itens por fatura
+# ===============================
+def test_items_per_invoice_within_limit(cfg):
+    preflight._check_items_per_invoice(pd.Series(["111"] * 13 + ["222"] * 2))
+
+
+def test_items_per_invoice_over_limit(cfg):
+    docs = pd.Series(["111"] * 20 + ["222"] * 2 + ["333"] * 14)
+    with pytest.raises(ValueError, match=r"2 fatura\(s\) com mais itens que MAX_ITEMS=13: 111 \(20\), 333 \(14\)"):
+        preflight._check_items_per_invoice(docs)